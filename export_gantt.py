@@ -2,15 +2,42 @@
 """Simple GitHub Project → Mermaid Gantt exporter."""
 
 import argparse
-import json
+import base64
+import binascii
+import hashlib
 import os
 import re
 import sys
+import threading
 import urllib.request
 import urllib.error
-from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import lru_cache
+from itertools import groupby
+
+try:
+    import orjson as _json
+except ImportError:  # orjson is optional, fall back to the stdlib
+    import json as _json
+
+try:
+    import httpx
+except ImportError:  # httpx is optional, fall back to urllib
+    httpx = None
 
 GRAPHQL_URL = "https://api.github.com/graphql"
+PAGE_SIZE = 100
+MAX_WORKERS = 8
+# Set to None (--no-cache) to disable the response cache
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "gantt-exporter"
+)
+_ESCAPE_TABLE = str.maketrans({"\n": " ", "\r": " ", ":": " "})
+
+
+_session = None
+_session_lock = threading.Lock()
 
 
 def die(msg):
@@ -18,42 +45,138 @@ def die(msg):
     sys.exit(1)
 
 
+def json_dumps(obj):
+    """Serialize obj to JSON bytes, whichever JSON backend is in use."""
+    data = _json.dumps(obj)
+    return data if isinstance(data, bytes) else data.encode()
+
+
+def read_body(r):
+    """Read a response body, straight into a preallocated buffer when its size is known."""
+    length = int(r.headers.get("Content-Length") or 0)
+    if not length:
+        return r.read()
+    buf = bytearray(length)
+    view = memoryview(buf)
+    pos = 0
+    while pos < length:
+        n = r.readinto(view[pos:])
+        if not n:
+            break
+        pos += n
+    return buf if pos == length else buf[:pos]
+
+
+def cache_path(token, data):
+    """Cache file for a request body, keyed by token too so users never share entries."""
+    if not CACHE_DIR:
+        return None
+    key = hashlib.sha256(token.encode() + b"\0" + data).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def read_cache(path):
+    if not path:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return _json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache(path, headers, body):
+    if not path:
+        return
+    entry = {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"), "body": body}
+    if not entry["etag"] and not entry["last_modified"]:
+        return
+    try:
+        # Entries hold private project data: keep them readable by the owner only
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(json_dumps(entry))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def get_session():
+    """Shared httpx client, so every request reuses one (HTTP/2 if possible) connection."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            try:
+                _session = httpx.Client(http2=True, timeout=30)
+            except ImportError:  # http2 needs the h2 package
+                _session = httpx.Client(timeout=30)
+        return _session
+
+
 def graphql(token, query, variables):
-    data = json.dumps({"query": query, "variables": variables}).encode()
-    req = urllib.request.Request(GRAPHQL_URL, data=data, method="POST")
-    req.add_header("Authorization", f"Bearer {token}")
-    req.add_header("Content-Type", "application/json")
+    data = json_dumps({"query": query, "variables": variables})
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+    }
+
+    path = cache_path(token, data)
+    cached = read_cache(path)
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    if httpx is not None:
+        r = get_session().post(GRAPHQL_URL, content=data, headers=headers)
+        if r.status_code == 304 and cached:
+            return cached["body"]
+        if r.status_code >= 400:
+            die(f"GitHub API error {r.status_code}: {r.text}")
+        body = _json.loads(r.content)
+        write_cache(path, r.headers, body)
+        return body
+
+    req = urllib.request.Request(GRAPHQL_URL, data=data, headers=headers, method="POST")
     try:
         with urllib.request.urlopen(req, timeout=30) as r:
-            return json.loads(r.read())
+            body = _json.loads(read_body(r))
+            write_cache(path, r.headers, body)
+            return body
     except urllib.error.HTTPError as e:
+        if e.code == 304 and cached:
+            return cached["body"]
         die(f"GitHub API error {e.code}: {e.read().decode()}")
 
 
-def fetch_items(token, login, project_number):
+def fetch_items(token, login, project_number, repo=None):
+    """Fetch all project items.
+
+    When repo is an (owner, name) pair, the repository milestones are fetched
+    in the same request as the first page. Returns (title, items, milestones),
+    milestones being None when no repo is given.
+    """
     query = """
-    query($login: String!, $num: Int!, $after: String) {
+    query($login: String!, $num: Int!, $first: Int!, $after: String,
+          $withRepo: Boolean!, $owner: String!, $repo: String!) {
+      repository(owner: $owner, name: $repo) @include(if: $withRepo) {
+        milestones(first: 100, states: [OPEN, CLOSED]) {
+          nodes { title dueOn }
+        }
+      }
       user(login: $login) {
         projectV2(number: $num) {
           title
-          items(first: 100, after: $after) {
+          items(first: $first, after: $after) {
+            totalCount
             pageInfo { hasNextPage endCursor }
             nodes {
               content {
-                __typename
-                ... on Issue {
-                  title
-                  closedAt
-                  milestone { title dueOn }
-                }
-                ... on PullRequest {
-                  title
-                  closedAt
-                  milestone { title dueOn }
-                }
-                ... on DraftIssue {
-                  title
-                }
+                ... on Issue { closedAt milestone { title dueOn } }
+                ... on PullRequest { closedAt milestone { title dueOn } }
               }
               fieldValues(first: 20) {
                 nodes {
@@ -71,30 +194,84 @@ def fetch_items(token, login, project_number):
       }
     }
     """
-    items = []
-    after = None
-    title = ""
-    while True:
-        resp = graphql(token, query, {"login": login, "num": project_number, "after": after})
-        proj = resp["data"]["user"]["projectV2"]
-        title = proj["title"]
-        for node in proj["items"]["nodes"]:
-            items.append(node)
+    owner, repo_name = repo or ("", "")
+
+    def variables(after, with_repo=False):
+        return {
+            "login": login, "num": project_number, "first": PAGE_SIZE, "after": after,
+            "withRepo": with_repo, "owner": owner, "repo": repo_name,
+        }
+
+    def fetch_page(after):
+        return graphql(token, query, variables(after))["data"]["user"]["projectV2"]
+
+    resp = graphql(token, query, variables(None, with_repo=bool(repo)))
+    milestones = None
+    if repo:
+        repo_data = (resp.get("data") or {}).get("repository")
+        if not repo_data:
+            if "errors" in resp:
+                die(f"GraphQL error: {resp['errors']}")
+            die(f"Repository {owner}/{repo_name} not found or no access")
+        milestones = repo_data.get("milestones", {}).get("nodes", [])
+
+    proj = resp["data"]["user"]["projectV2"]
+    title = proj["title"]
+    nodes = proj["items"]["nodes"]
+    page = proj["items"]["pageInfo"]
+
+    # Preallocate for the whole project, pages are slotted in by offset
+    items = [None] * max(proj["items"]["totalCount"], len(nodes))
+    items[:len(nodes)] = nodes
+    filled = len(nodes)
+
+    # Cursors are offsets in disguise: fetch all remaining pages at once
+    if page["hasNextPage"] and page["endCursor"]:
+        offsets = range(filled, len(items), PAGE_SIZE)
+        cursors = [offset_cursor(page["endCursor"], filled, offset) for offset in offsets]
+        if cursors and None not in cursors:
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                for offset, proj in zip(offsets, executor.map(fetch_page, cursors)):
+                    nodes = proj["items"]["nodes"]
+                    items[offset:offset + len(nodes)] = nodes
+                    filled = offset + len(nodes)
+                    page = proj["items"]["pageInfo"]
+    del items[filled:]
+    if None in items:  # items removed while fetching left gaps
+        items = [node for node in items if node is not None]
+
+    # Serial walk for opaque cursors, or items added while fetching
+    while page["hasNextPage"]:
+        proj = fetch_page(page["endCursor"])
+        items.extend(proj["items"]["nodes"])
         page = proj["items"]["pageInfo"]
-        if not page["hasNextPage"]:
-            break
-        after = page["endCursor"]
-    return title, items
+    return title, items, milestones
 
 
-def extract_field(fields, name):
-    for f in fields:
-        field_meta = f.get("field")
-        if not field_meta:
-            continue
-        if field_meta.get("name") == name:
-            return f.get("text") or f.get("date") or f.get("name")
-    return None
+def offset_cursor(cursor, cursor_offset, offset):
+    """Build the cursor pointing at offset from a cursor known to point at cursor_offset.
+
+    Returns None if the cursor does not encode that offset (opaque cursor).
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        decoded = base64.b64decode(padded, validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    m = re.fullmatch(r"(\D*)(\d+)", decoded)
+    if not m or int(m.group(2)) != cursor_offset:
+        return None
+    encoded = base64.b64encode(f"{m.group(1)}{offset}".encode()).decode()
+    return encoded if cursor.endswith("=") else encoded.rstrip("=")
+
+
+def field_map(fields):
+    """Map field name -> value for an item's field values (first occurrence wins)."""
+    return {
+        f["field"]["name"]: f.get("text") or f.get("date") or f.get("name")
+        for f in reversed(fields)
+        if f.get("field") and f["field"].get("name")
+    }
 
 
 def extract_milestone(node):
@@ -127,6 +304,7 @@ def extract_iteration(fields):
     return None
 
 
+@lru_cache(maxsize=4096)  # dates repeat a lot across items (milestones, iterations)
 def parse_date(s):
     if not s:
         return None
@@ -140,31 +318,8 @@ def parse_date(s):
 
 
 def escape(s):
-    return re.sub(r"[\n\r:]+", " ", s).strip()
-
-
-def fetch_repo_milestones(token, owner, repo):
-    """Fetch milestones directly from a repository."""
-    query = """
-    query($owner: String!, $repo: String!) {
-      repository(owner: $owner, name: $repo) {
-        milestones(first: 100, states: [OPEN, CLOSED]) {
-          nodes {
-            title
-            dueOn
-            description
-          }
-        }
-      }
-    }
-    """
-    resp = graphql(token, query, {"owner": owner, "repo": repo})
-    if "errors" in resp:
-        die(f"GraphQL error: {resp['errors']}")
-    repo_data = resp.get("data", {}).get("repository")
-    if not repo_data:
-        die(f"Repository {owner}/{repo} not found or no access")
-    return repo_data.get("milestones", {}).get("nodes", [])
+    # Newlines and colons break Mermaid lines, whitespace runs are collapsed
+    return " ".join(s.translate(_ESCAPE_TABLE).split())
 
 
 def main():
@@ -178,13 +333,24 @@ def main():
     parser.add_argument("--min-duration", type=int, default=3, help="Minimum visual duration in days for short tasks")
     parser.add_argument("--list", action="store_true", help="List all items (debug)")
     parser.add_argument("--include-undated", action="store_true", help="Include tasks without dates (uses today)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use or update the response cache")
     args = parser.parse_args()
 
+    if args.no_cache:
+        global CACHE_DIR
+        CACHE_DIR = None
+
     token = os.environ.get("GITHUB_TOKEN") or os.environ.get("GH_TOKEN")
     if not token:
         die("Set GITHUB_TOKEN or GH_TOKEN")
 
-    title, raw = fetch_items(token, args.login, args.project)
+    repo = None
+    if args.repo:
+        repo = tuple(args.repo.split("/"))
+        if len(repo) != 2:
+            die("--repo must be in format owner/name")
+
+    title, raw, repo_milestones = fetch_items(token, args.login, args.project, repo)
 
     # Debug: list all items
     if args.list:
@@ -192,12 +358,13 @@ def main():
         print(f"Items: {len(raw)}")
         for i, node in enumerate(raw):
             fields = (node.get("fieldValues") or {}).get("nodes") or []
-            name = extract_field(fields, "Title") or "(no title)"
+            fmap = field_map(fields)
+            name = fmap.get("Title") or "(no title)"
             ms = extract_milestone(node)
             it = extract_iteration(fields)
-            start = extract_field(fields, args.start)
-            end = extract_field(fields, args.end)
-            group = extract_field(fields, args.group)
+            start = fmap.get(args.start)
+            end = fmap.get("Target date")
+            group = fmap.get(args.group)
             print(f"\n{i+1}. {name}")
             print(f"   Raw node: {node}")
             print(f"   Group: {group or '-'}")
@@ -210,25 +377,21 @@ def main():
 
     # Parse items into tasks and milestones
     tasks = []
-    milestones = {}  # title -> due date
+    max_group_name_len = 0  # for leftPadding
     today = date.today()
 
-    # Fetch milestones from repo if specified
-    if args.repo:
-        parts = args.repo.split("/")
-        if len(parts) != 2:
-            die("--repo must be in format owner/name")
-        owner, repo_name = parts
-        repo_milestones = fetch_repo_milestones(token, owner, repo_name)
-        for ms in repo_milestones:
-            ms_due = parse_date(ms.get("dueOn"))
-            if ms_due and ms.get("title"):
-                milestones[ms["title"]] = ms_due
+    # title -> due date, seeded from the repo if specified
+    milestones = {
+        ms["title"]: ms_due
+        for ms in repo_milestones or ()
+        if ms.get("title") and (ms_due := parse_date(ms.get("dueOn")))
+    }
 
     for node in raw:
         fields = (node.get("fieldValues") or {}).get("nodes") or []
         content = node.get("content") or {}
-        name = extract_field(fields, "Title")
+        fmap = field_map(fields)
+        name = fmap.get("Title")
         if not name:
             continue
 
@@ -236,24 +399,23 @@ def main():
         ms = extract_milestone(node)
         if ms and ms.get("title"):
             ms_due = parse_date(ms.get("due"))
-            if ms_due and ms["title"] not in milestones:
-                milestones[ms["title"]] = ms_due
+            if ms_due:
+                milestones.setdefault(ms["title"], ms_due)
 
         # Check for iteration (can use as date source)
         it = extract_iteration(fields)
 
-        start = parse_date(extract_field(fields, args.start))
+        start = parse_date(fmap.get(args.start))
 
         # End date priority: closedAt > Target date > default duration
         closed_at = parse_date(content.get("closedAt"))
-        target_date = parse_date(extract_field(fields, "Target date"))
+        target_date = parse_date(fmap.get("Target date"))
         end = closed_at or target_date
 
         # Fallback to iteration dates if no start/end
         if not start and not end and it:
             start = parse_date(it.get("start"))
             if start and it.get("duration"):
-                from datetime import timedelta
                 end = start + timedelta(days=int(it["duration"]))
 
         # Handle tasks without dates
@@ -268,54 +430,52 @@ def main():
             start = end
         if not end:
             # Give task a default duration
-            from datetime import timedelta
             end = start + timedelta(days=args.default_duration)
 
         # Ensure minimum visual duration
-        from datetime import timedelta
         if (end - start).days < args.min_duration:
             end = start + timedelta(days=args.min_duration)
 
-        group = extract_field(fields, args.group) or "Other"
-        tasks.append({"name": escape(name), "group": escape(group), "start": start, "end": end})
+        group = escape(fmap.get(args.group) or "Other")
+        if len(group) > max_group_name_len:
+            max_group_name_len = len(group)
+        tasks.append({"name": escape(name), "group": group, "start": start, "end": end})
 
     if not tasks and not milestones:
         die("No tasks found")
 
-    # Group tasks
-    groups = {}
-    for t in tasks:
-        groups.setdefault(t["group"], []).append(t)
+    # Sort once by group then start, sections are consecutive runs
+    tasks.sort(key=lambda t: (t["group"], t["start"]))
 
-    # Calculate max group name length for leftPadding
-    max_group_name_len = max((len(task["group"]) for task in tasks), default=0)
     if milestones:
         max_group_name_len = max(max_group_name_len, len("Milestones"))
     # Rough estimate: ~6-7 pixels per character, aim for padding
     left_padding = max(150, min(500, max_group_name_len * 7))
 
-    # Output
-    print("```mermaid")
-    print(f"%%{{init: {{'gantt': {{'leftPadding': {left_padding}}}}}}}%%")
-    print("gantt")
-    print(f"  title {escape(title)}")
-    print("  dateFormat YYYY-MM-DD")
-    print()
+    # Output, collected and written in one go
+    out = [
+        "```mermaid",
+        f"%%{{init: {{'gantt': {{'leftPadding': {left_padding}}}}}}}%%",
+        "gantt",
+        f"  title {escape(title)}",
+        "  dateFormat YYYY-MM-DD",
+        "",
+    ]
 
     # Milestones section
     if milestones:
-        print("  section Milestones")
-        for ms_title, ms_due in sorted(milestones.items(), key=lambda x: x[1]):
-            print(f"  {escape(ms_title)} : milestone, m{hash(ms_title) % 1000}, {ms_due}, 0d")
-        print()
+        out.append("  section Milestones")
+        for i, (ms_title, ms_due) in enumerate(sorted(milestones.items(), key=lambda x: x[1])):
+            out.append(f"  {escape(ms_title)} : milestone, m{i}, {ms_due}, 0d")
+        out.append("")
 
     # Task sections
-    for g in sorted(groups.keys()):
-        print(f"  section {g}")
-        for t in sorted(groups[g], key=lambda x: x["start"]):
-            print(f"  {t['name']} : {t['start']}, {t['end']}")
-        print()
-    print("```")
+    for g, group_tasks in groupby(tasks, key=lambda t: t["group"]):
+        out.append(f"  section {g}")
+        out.extend(f"  {t['name']} : {t['start']}, {t['end']}" for t in group_tasks)
+        out.append("")
+    out.append("```")
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 if __name__ == "__main__":